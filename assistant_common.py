@@ -0,0 +1,136 @@
+import os
+import queue
+import re
+from collections import deque
+import numpy as np
+from openwakeword.model import Model
+
+# --- Wake-Word-Modell ---
+# Von download_models.py erzeugte int8-Modelle, werden bevorzugt falls vorhanden.
+# Den Großteil der Rechenzeit braucht das Embedding-Modell, nicht der Kopf.
+INT8_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+INT8_MODEL_PATH = os.path.join(INT8_MODEL_DIR, "hey_jarvis.onnx")
+INT8_EMBEDDING_MODEL_PATH = os.path.join(INT8_MODEL_DIR, "embedding_model.onnx")
+INT8_MELSPEC_MODEL_PATH = os.path.join(INT8_MODEL_DIR, "melspectrogram.onnx")
+
+def load_wakeword_model():
+    """Lädt "hey_jarvis" und bevorzugt dabei die vorhandenen int8-Modelle."""
+    # Model reicht die Pfade der Feature-Modelle an AudioFeatures weiter
+    feature_models = {}
+    if os.path.exists(INT8_EMBEDDING_MODEL_PATH):
+        feature_models["embedding_model_path"] = INT8_EMBEDDING_MODEL_PATH
+    if os.path.exists(INT8_MELSPEC_MODEL_PATH):
+        feature_models["melspec_model_path"] = INT8_MELSPEC_MODEL_PATH
+    wakeword = INT8_MODEL_PATH if os.path.exists(INT8_MODEL_PATH) else "hey_jarvis"
+    if wakeword == "hey_jarvis" and not feature_models:
+        return Model(wakeword_models=["hey_jarvis"])
+    return Model(wakeword_models=[wakeword], inference_framework="onnx", **feature_models)
+
+def warm_up_wakeword_model(oww_model, samples):
+    """Wärmt das Wake-Word-Modell mit Stille auf und leert danach seinen Puffer."""
+    # Die ersten Inferenzen sind deutlich langsamer, weil ONNX Runtime erst
+    # Kernel auswählt und Puffer anlegt. samples entspricht einem Modellaufruf.
+    silence = np.zeros(samples, dtype=np.int16)
+    oww_model.predict(silence)
+    oww_model.predict(silence)
+    oww_model.reset()
+
+# --- Speech-to-Text ---
+def warm_up_recognizer(recognizer, samples):
+    """Wärmt den Vosk-Erkenner mit samples Samples Stille auf und setzt ihn zurück."""
+    recognizer.AcceptWaveform(b"\x00" * (samples * 2))
+    recognizer.Reset()
+
+# --- Audio ---
+NOISE_FLOOR_MIN = 30.0    # Untergrenze für das Grundrauschen (RMS, int16)
+NOISE_FLOOR_RISE = 0.005  # Anteil, um den das Grundrauschen pro Frame zur aktuellen Energie steigt
+
+def make_queue_callback(frame_queue, enabled=None):
+    """Erzeugt einen Stream-Callback, der die Frames nur in die Queue kopiert."""
+    # Mit einem threading.Event als enabled nur, solange dieses gesetzt ist
+    def callback(indata, frames, time, status):
+        # Läuft im Echtzeit-Thread von PortAudio: nur kopieren und weiterreichen
+        if status:
+            print(status)
+        if enabled is not None and not enabled.is_set():
+            return
+        try:
+            frame_queue.put_nowait(bytes(indata))
+        except queue.Full:
+            pass  # Lieber einen Frame verwerfen als den Audio-Thread blockieren
+    return callback
+
+def is_silent(audio_frame, threshold):
+    """Prüft, ob alle Samples des Frames unter threshold liegen."""
+    # max()/min() sind vektorisierte Reduktionen ohne Zwischenarray
+    # (np.abs würde eines anlegen und bei -32768 überlaufen)
+    return int(audio_frame.max()) < threshold and int(audio_frame.min()) > -threshold
+
+def make_speech_gate(speech_ratio, pre_roll_frames, hangover_frames, min_noise_floor=NOISE_FLOOR_MIN):
+    """Erzeugt ein Energie-Gate, das nur Frames rund um Sprache zum Wake-Word-Modell durchlässt."""
+    # gate(audio_frame) liefert die jetzt weiterzugebenden Frames. Der Vorlauf sollte
+    # den Kontext des Modells (~1,3 s) abdecken, denn beim Öffnen wird das Modell
+    # nicht zurückgesetzt: reset() würde die nächsten Scores auf 0 zwingen und das
+    # Embedding-Modell über Sekunden an Zufallsaudio laufen lassen. Die Nahtstelle
+    # zur verworfenen Stille davor wird in Kauf genommen.
+    noise_floor = None
+    pre_roll = deque(maxlen=pre_roll_frames)  # Letzte stille Frames vor der Sprache
+    hangover_left = 0   # Frames, die nach der letzten Sprache noch durchgehen
+
+    def gate(audio_frame):
+        nonlocal noise_floor, hangover_left
+        rms = float(np.sqrt(np.mean(np.square(audio_frame, dtype=np.int32))))
+        is_speech = noise_floor is not None and rms > noise_floor * speech_ratio
+
+        # Grundrauschen bei jedem Frame nachführen: sofort auf ein neues Minimum
+        # fallen, sonst langsam steigen, damit dauerhaft lautere Umgebungen gelernt
+        # werden. Die Untergrenze verhindert, dass digitale Stille das Gate abschaltet.
+        if noise_floor is None or rms < noise_floor:
+            noise_floor = rms
+        else:
+            noise_floor += (rms - noise_floor) * NOISE_FLOOR_RISE
+        noise_floor = max(noise_floor, min_noise_floor)
+
+        if is_speech:
+            frames = list(pre_roll)
+            frames.append(audio_frame)
+            pre_roll.clear()
+            hangover_left = hangover_frames
+            return frames
+        if hangover_left > 0:
+            hangover_left -= 1
+            return [audio_frame]
+        pre_roll.append(audio_frame)
+        return []
+    return gate
+
+def make_batcher(model, chunk_samples, n):
+    """Erzeugt eine Funktion, die Frames sammelt und das Modell nur alle n Frames aufruft."""
+    # predict_batched(audio_frame) liefert die Vorhersage des vollen Puffers,
+    # oder None, solange noch Frames fehlen
+    batch = np.empty(chunk_samples * n, dtype=np.int16)
+    batch_frames = 0
+
+    def predict_batched(audio_frame):
+        nonlocal batch_frames
+        batch[batch_frames * chunk_samples:(batch_frames + 1) * chunk_samples] = audio_frame
+        batch_frames += 1
+        if batch_frames < n:
+            return None
+        batch_frames = 0
+        return model.predict(batch)
+    return predict_batched
+
+# --- Befehle ---
+def compile_keywords(keywords):
+    """Gibt eine Funktion zurück, die den Befehl zum längsten Schlüsselwort im Text liefert (oder None)."""
+    # Alle Schlüsselwörter werden zu einem einzigen Regex zusammengefasst, damit der
+    # erkannte Text nur einmal durchsucht wird. Längere Schlüsselwörter stehen vorne,
+    # damit z.B. "taschenrechner" vor "rechner" greift.
+    pattern = re.compile("|".join(
+        re.escape(kw) for kw in sorted(keywords, key=len, reverse=True)))
+
+    def find_command(command_lower):
+        keyword = max(pattern.findall(command_lower), key=len, default=None)
+        return keywords.get(keyword)
+    return find_command
@@ -0,0 +1,45 @@
+import os
+import sys
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Programmstart ---
+# Programme werden in einem Hintergrund-Thread gestartet, damit der
+# Prozessstart (CreateProcess unter Windows) die Antwort nicht verzögert.
+LAUNCH_EXECUTOR = ThreadPoolExecutor(max_workers=2)
+# Unter Windows ohne Konsole, sonst in einer eigenen Sitzung starten, damit
+# das Programm unabhängig vom Assistenten weiterläuft
+if sys.platform == "win32":
+    LAUNCH_OPTIONS = {"creationflags": subprocess.DETACHED_PROCESS}
+else:
+    LAUNCH_OPTIONS = {"start_new_session": True}
+
+def launch(args):
+    """Startet ein Programm im Hintergrund, ohne auf den Prozessstart zu warten."""
+    future = LAUNCH_EXECUTOR.submit(subprocess.Popen, args, **LAUNCH_OPTIONS)
+    future.add_done_callback(report_launch_error)
+
+def report_launch_error(future):
+    """Meldet einen fehlgeschlagenen Programmstart."""
+    error = future.exception()
+    if error:
+        print(f"[ACTION] Programm konnte nicht gestartet werden: {error}")
+
+def open_url(url):
+    """Öffnet eine URL im Hintergrund im Standardbrowser."""
+    # Wie launch(): Fehler (z.B. kein registrierter Handler) nur melden,
+    # statt den Assistenten abstürzen zu lassen
+    future = LAUNCH_EXECUTOR.submit(open_url_now, url)
+    future.add_done_callback(report_launch_error)
+
+def open_url_now(url):
+    """Öffnet eine URL im Standardbrowser und wartet auf den Start."""
+    if sys.platform == "win32":
+        # os.startfile öffnet die URL direkt per ShellExecute, ohne dass
+        # webbrowser zuerst die installierten Browser sucht.
+        os.startfile(url)
+    else:
+        # Erst bei Bedarf importieren, das spart Zeit beim Programmstart.
+        import webbrowser
+        if not webbrowser.open(url):
+            raise OSError(f"Kein Browser für {url} gefunden")
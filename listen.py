@@ -1,12 +1,19 @@
-import time
+import queue
 import sounddevice as sd
 import numpy as np
-from openwakeword.model import Model
+from assistant_common import (load_wakeword_model, warm_up_wakeword_model,
+                              make_queue_callback, make_speech_gate, make_batcher)
 
 # --- Konfiguration ---
 WAKE_WORD = "computer" # Das Wort, auf das wir hören
 SAMPLE_RATE = 16000      # 16kHz, Standard für die meisten Sprachmodelle
 CHUNK_SAMPLES = 1280     # 80ms Audio-Chunks (16000 * 0.080)
+VAD_ENABLED = True       # Modell nur befragen, wenn der Frame lauter als das Grundrauschen ist
+VAD_SPEECH_RATIO = 2.0   # Ab diesem Vielfachen des Grundrauschens gilt ein Frame als Sprache
+VAD_PRE_ROLL_FRAMES = 16 # Frames vor der Sprache, die trotzdem ans Modell gehen (1,28 s Modellkontext)
+VAD_HANGOVER_FRAMES = 5  # Frames nach der Sprache, die noch ans Modell gehen (400 ms)
+QUEUE_SIZE = 8           # Max. wartende Frames, bei Überlauf werden neue Frames verworfen
+BATCH_FRAMES = 3         # Frames pro Modellaufruf (3 x 80 ms = 240 ms)
 
 def main():
     """Hauptfunktion, die das Mikrofon abhört und auf das Wake Word wartet."""
@@ -14,36 +21,56 @@ def main():
     # Lade das vortrainierte Modell für "hey_jarvis" (kommt "computer" am nächsten)
     # openWakeWord hat kein "computer"-Modell, aber "hey jarvis" ist ein guter Startpunkt.
     # Wir können später ein eigenes Modell trainieren.
-    oww_model = Model(wakeword_models=["hey_jarvis"])
+    oww_model = load_wakeword_model()
+
+    warm_up_wakeword_model(oww_model, CHUNK_SAMPLES * BATCH_FRAMES)
 
     print(f"\nBereit. Höre auf das Wake Word: '{WAKE_WORD}'...")
     print("Sprich deutlich in dein Mikrofon. Drücke Strg+C zum Beenden.")
 
-    # Callback-Funktion für den Audio-Stream
-    def callback(indata, frames, time, status):
-        if status:
-            print(status)
-        
-        # Konvertiere die Audiodaten in das richtige Format
-        audio_frame = np.frombuffer(indata, dtype=np.int16)
+    # Lässt nur Frames rund um Sprache (mit Vor- und Nachlauf) zum Modell durch
+    speech_gate = make_speech_gate(VAD_SPEECH_RATIO, VAD_PRE_ROLL_FRAMES, VAD_HANGOVER_FRAMES)
+
+    # Sammelpuffer, damit das Modell nur alle BATCH_FRAMES Frames aufgerufen wird
+    predict_batched = make_batcher(oww_model, CHUNK_SAMPLES, BATCH_FRAMES)
 
-        # Füttere das Modell mit dem Audio-Frame
-        prediction = oww_model.predict(audio_frame)
+    # Audio-Frames vom Callback an den Hauptthread
+    frame_queue = queue.Queue(maxsize=QUEUE_SIZE)
 
-        # Überprüfe, ob das Wake Word erkannt wurde
-        # Wir prüfen hier auf das "hey_jarvis" Modell
-        if prediction["hey_jarvis"] > 0.5: # 0.5 ist der Schwellenwert
-            print(f"Wake Word '{WAKE_WORD}' erkannt! Score: {prediction['hey_jarvis']:.2f}")
+    # Callback-Funktion für den Audio-Stream. Sie läuft im Echtzeit-Thread von
+    # PortAudio und reicht die Daten nur weiter, das Modell läuft im Hauptthread.
+    callback = make_queue_callback(frame_queue)
 
     try:
         # Starte den Audio-Stream vom Standard-Mikrofon
-        with sd.InputStream(samplerate=SAMPLE_RATE, 
-                             channels=1, 
-                             dtype='int16', 
-                             blocksize=CHUNK_SAMPLES, 
-                             callback=callback):
+        with sd.RawInputStream(samplerate=SAMPLE_RATE, 
+                                channels=1, 
+                                dtype='int16', 
+                                blocksize=CHUNK_SAMPLES, 
+                                callback=callback):
             while True:
-                time.sleep(1)
+                # Mit Timeout warten, damit Strg+C auch unter Windows ankommt
+                try:
+                    frame = frame_queue.get(timeout=1)
+                except queue.Empty:
+                    continue
+
+                # Konvertiere die Audiodaten in das richtige Format
+                audio_frame = np.frombuffer(frame, dtype=np.int16)
+
+                # Stille Frames gar nicht erst durch das Modell schicken
+                frames = speech_gate(audio_frame) if VAD_ENABLED else [audio_frame]
+
+                for audio_frame in frames:
+                    # Frames sammeln und das Modell mit mehreren Frames auf einmal füttern
+                    prediction = predict_batched(audio_frame)
+                    if prediction is None:
+                        continue
+
+                    # Überprüfe, ob das Wake Word erkannt wurde
+                    # Wir prüfen hier auf das "hey_jarvis" Modell
+                    if prediction["hey_jarvis"] > 0.5: # 0.5 ist der Schwellenwert
+                        print(f"Wake Word '{WAKE_WORD}' erkannt! Score: {prediction['hey_jarvis']:.2f}")
     except KeyboardInterrupt:
         print("\nProgramm beendet.")
     except Exception as e:
@@ -51,4 +78,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
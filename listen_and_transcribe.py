@@ -1,87 +1,117 @@
 import time
 import json
+import queue
 import sounddevice as sd
 import numpy as np
-from openwakeword.model import Model
 from vosk import Model as VoskModel, KaldiRecognizer
+from assistant_common import (load_wakeword_model, warm_up_wakeword_model,
+                              warm_up_recognizer, make_queue_callback, is_silent,
+                              make_speech_gate, make_batcher)
 
 # --- Konfiguration ---
 WAKE_WORD = "hey jarvis"
 SAMPLE_RATE = 16000
 CHUNK_SAMPLES = 1280
-RECORD_SECONDS = 5  # Wie lange nach dem Wake Word zugehört werden soll
-
-# --- Globale Zustandsvariablen ---
-wake_word_detected = False
-audio_buffer = []
+RECORD_SECONDS = 5  # Wie lange nach dem Wake Word höchstens zugehört werden soll
+VAD_ENABLED = True       # Modell nur befragen, wenn der Frame lauter als das Grundrauschen ist
+VAD_SPEECH_RATIO = 2.0   # Ab diesem Vielfachen des Grundrauschens gilt ein Frame als Sprache
+VAD_PRE_ROLL_FRAMES = 16 # Frames vor der Sprache, die trotzdem ans Modell gehen (1,28 s Modellkontext)
+VAD_HANGOVER_FRAMES = 5  # Frames nach der Sprache, die noch ans Modell gehen (400 ms)
+QUEUE_SIZE = 8           # Max. wartende Frames, bei Überlauf werden neue Frames verworfen
+BATCH_FRAMES = 3         # Frames pro Modellaufruf (3 x 80 ms = 240 ms)
+SILENCE_THRESHOLD = 500  # Max. Amplitude (int16), unter der ein Frame als still gilt
+SILENCE_TIMEOUT = 1.5    # Sekunden Stille nach dem Sprechen, bis die Aufnahme endet
 
 def main():
     """Hauptfunktion, die auf das Wake Word wartet und dann den Befehl transkribiert."""
-    global wake_word_detected, audio_buffer
-
     print("Initialisiere Wake-Word-Modell...")
-    oww_model = Model(wakeword_models=["hey_jarvis"])
+    oww_model = load_wakeword_model()
+
+    warm_up_wakeword_model(oww_model, CHUNK_SAMPLES * BATCH_FRAMES)
 
     print("Initialisiere Speech-to-Text-Modell (Vosk)... (Download kann dauern)")
     # Lade ein kleines deutsches Vosk-Modell. Beim ersten Mal wird es heruntergeladen.
     vosk_model = VoskModel(lang="de")
     recognizer = KaldiRecognizer(vosk_model, SAMPLE_RATE)
+    warm_up_recognizer(recognizer, SAMPLE_RATE // 10)
 
     print(f"\nBereit. Höre auf das Wake Word: '{WAKE_WORD}'...")
     print("Drücke Strg+C zum Beenden.")
 
-    # Callback-Funktion für den Audio-Stream
-    def callback(indata, frames, time, status):
-        global wake_word_detected, audio_buffer
-        if status:
-            print(status)
-        
-        audio_frame = np.frombuffer(indata, dtype=np.int16)
-
-        if wake_word_detected:
-            # Wenn Wake Word erkannt wurde, Audio für die Transkription sammeln
-            audio_buffer.append(bytes(audio_frame))
-        else:
-            # Ansonsten auf Wake Word prüfen
-            prediction = oww_model.predict(audio_frame)
-            if prediction["hey_jarvis"] > 0.5:
-                print("Wake Word erkannt! Höre jetzt auf den Befehl...")
-                wake_word_detected = True
-                audio_buffer = [] # Buffer für die neue Aufnahme zurücksetzen
+    wake_word_detected = False
+    record_start = 0.0
+    last_speech = 0.0
+
+    # Lässt nur Frames rund um Sprache (mit Vor- und Nachlauf) zum Modell durch
+    speech_gate = make_speech_gate(VAD_SPEECH_RATIO, VAD_PRE_ROLL_FRAMES, VAD_HANGOVER_FRAMES)
+
+    # Sammelpuffer, damit das Modell nur alle BATCH_FRAMES Frames aufgerufen wird
+    predict_batched = make_batcher(oww_model, CHUNK_SAMPLES, BATCH_FRAMES)
+
+    # Audio-Frames vom Callback an den Hauptthread
+    frame_queue = queue.Queue(maxsize=QUEUE_SIZE)
+
+    # Callback-Funktion für den Audio-Stream. Sie reicht die Daten nur weiter,
+    # Wake-Word-Modell und Vosk laufen im Hauptthread.
+    callback = make_queue_callback(frame_queue)
 
     # Starte den Audio-Stream
-    with sd.InputStream(samplerate=SAMPLE_RATE, channels=1, dtype='int16', blocksize=CHUNK_SAMPLES, callback=callback):
+    with sd.RawInputStream(samplerate=SAMPLE_RATE, channels=1, dtype='int16', blocksize=CHUNK_SAMPLES, callback=callback):
         while True:
+            # Mit Timeout warten, damit Strg+C auch unter Windows ankommt
+            try:
+                frame = frame_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+
             if wake_word_detected:
-                # Warte die definierte Aufnahmezeit ab
-                time.sleep(RECORD_SECONDS)
+                # Audio direkt an Vosk streamen, statt es erst zu sammeln. Sobald
+                # Vosk das Satzende erkennt, steht der Befehl ohne Wartezeit fest.
+                now = time.monotonic()
+                if not is_silent(np.frombuffer(frame, dtype=np.int16), SILENCE_THRESHOLD):
+                    last_speech = now
+
+                command = ""
+                if recognizer.AcceptWaveform(frame):
+                    command = json.loads(recognizer.Result()).get("text", "")
+                timed_out = now - record_start > RECORD_SECONDS
+                # Nach dem Sprechen nicht bis zum Ende der Aufnahmezeit warten
+                silence_ended = last_speech > record_start and now - last_speech > SILENCE_TIMEOUT
+                if not command and not timed_out and not silence_ended:
+                    continue
+                if not command:
+                    command = json.loads(recognizer.FinalResult()).get("text", "")
 
-                # Aufnahme beenden und verarbeiten
                 print("Aufnahme beendet. Verarbeite den Befehl...")
-                full_audio = b''.join(audio_buffer)
-                
-                if recognizer.AcceptWaveform(full_audio):
-                    result = json.loads(recognizer.Result())
-                    command = result.get("text", "")
-                    if command:
-                        print(f"--> Befehl erkannt: \"{command}\"")
-                    else:
-                        print("Konnte nichts verstehen. Bitte versuche es erneut.")
+                if command:
+                    print(f"--> Befehl erkannt: \"{command}\"")
                 else:
-                    # Fallback, falls AcceptWaveform nicht sofort klappt
-                    result = json.loads(recognizer.FinalResult())
-                    command = result.get("text", "")
-                    if command:
-                        print(f"--> Befehl erkannt: \"{command}\"")
-                    else:
-                        print("Konnte nichts verstehen. Bitte versuche es erneut.")
-                
+                    print("Konnte nichts verstehen. Bitte versuche es erneut.")
+
                 # System zurücksetzen für das nächste Wake Word
+                recognizer.Reset()
+                # Das Gate hat die Aufnahme nicht gesehen, also mit frischem Zustand weiter
+                speech_gate = make_speech_gate(VAD_SPEECH_RATIO, VAD_PRE_ROLL_FRAMES, VAD_HANGOVER_FRAMES)
                 wake_word_detected = False
-                audio_buffer = []
                 print(f"\nBereit. Höre auf das Wake Word: '{WAKE_WORD}'...")
-            
-            time.sleep(0.1)
+                continue
+
+            audio_frame = np.frombuffer(frame, dtype=np.int16)
+
+            # Stille Frames gar nicht erst durch das Modell schicken
+            frames = speech_gate(audio_frame) if VAD_ENABLED else [audio_frame]
+
+            # Ansonsten auf Wake Word prüfen, mit mehreren Frames auf einmal
+            for audio_frame in frames:
+                prediction = predict_batched(audio_frame)
+                if prediction is not None and prediction["hey_jarvis"] > 0.5:
+                    print("Wake Word erkannt! Höre jetzt auf den Befehl...")
+                    # Modellpuffer leeren, sonst löst dasselbe Wake Word erneut aus
+                    oww_model.reset()
+                    wake_word_detected = True
+                    record_start = time.monotonic()
+                    last_speech = record_start
+                    break
 
 if __name__ == "__main__":
     try:
@@ -1,201 +1,340 @@
 import time
 import json
-import subprocess
-import webbrowser
+from datetime import datetime
 import sounddevice as sd
 import numpy as np
 import edge_tts
 import asyncio
+import hashlib
+import io
 import os
+import queue
+import threading
 import pygame
-from openwakeword.model import Model
 from vosk import Model as VoskModel, KaldiRecognizer
+from launcher import launch, open_url
+from assistant_common import (load_wakeword_model, warm_up_wakeword_model,
+                              warm_up_recognizer, make_queue_callback, is_silent,
+                              compile_keywords, make_batcher)
 
 # --- Konfiguration ---
 WAKE_WORD = "hey jarvis"
 SAMPLE_RATE = 16000
 CHUNK_SAMPLES = 1280
 SILENCE_TIMEOUT = 2.0
+SILENCE_THRESHOLD = 500  # Max. Amplitude (int16), unter der ein Frame als still gilt
 MAX_RECORD_TIME = 30
 TTS_VOICE = "de-DE-KatjaNeural"
+QUEUE_SIZE = 8  # Max. wartende Frames, bei Überlauf werden neue Frames verworfen
+BATCH_FRAMES = 3  # Frames pro Modellaufruf (3 x 80 ms = 240 ms)
+# Hier liegen die vorab erzeugten MP3s der festen Ansagen
+PROMPT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "voice_assistant")
 
-# Initialisiere pygame mixer
-pygame.mixer.init()
+# Deutsche Namen für die Datumsansage (unabhängig vom System-Locale)
+WEEKDAYS_DE = ("Montag", "Dienstag", "Mittwoch", "Donnerstag", "Freitag", "Samstag", "Sonntag")
+MONTHS_DE = ("Januar", "Februar", "März", "April", "Mai", "Juni", "Juli",
+             "August", "September", "Oktober", "November", "Dezember")
+
+# Feste Ansagen, die nicht bei jedem Aufruf neu über das Netz erzeugt werden
+STATIC_PROMPTS = (
+    "Initialisiere System",
+    "System bereit",
+    "Ja?",
+    "Auf Wiedersehen",
+    "Befehl nicht erkannt",
+    "Öffne den Taschenrechner",
+    "Öffne Notepad",
+    "Öffne den Browser",
+    "Öffne YouTube",
+    "Öffne den Explorer",
+    "Hallo! Wie kann ich helfen?",
+)
+
+# Initialisiere pygame mixer passend zu Edge TTS (24 kHz Mono), damit beim
+# Abspielen nicht umgerechnet wird; der kleine Puffer senkt die Latenz
+pygame.mixer.init(frequency=24000, channels=1, buffer=512)
+
+# Dauerhafte Event-Loop für Edge TTS in einem Hintergrund-Thread, statt für
+# jede Ansage mit asyncio.run eine neue Loop auf- und wieder abzubauen
+tts_loop = asyncio.new_event_loop()
+threading.Thread(target=tts_loop.run_forever, daemon=True).start()
+
+# Text -> bereits dekodierte feste Ansage, wird von load_prompts() gefüllt
+prompt_sounds = {}
+
+async def synthesize(text):
+    """Erzeugt die MP3-Daten für einen Text mit Edge TTS."""
+    communicate = edge_tts.Communicate(text, TTS_VOICE)
+    
+    # MP3 direkt im Speicher sammeln statt über eine temporäre Datei
+    audio = io.BytesIO()
+    async for chunk in communicate.stream():
+        if chunk["type"] == "audio":
+            audio.write(chunk["data"])
+    return audio.getvalue()
 
 async def speak_async(text):
     """Spricht Text mit Edge TTS."""
     print(f"[SPEAK] {text}")
-    communicate = edge_tts.Communicate(text, TTS_VOICE)
-    temp_file = "temp_speech.mp3"
-    await communicate.save(temp_file)
+    
+    sound = prompt_sounds.get(text)
+    if sound is not None:
+        # Feste Ansagen liegen schon als PCM vor und starten sofort
+        channel = sound.play()
+        while channel.get_busy():
+            await asyncio.sleep(0.02)
+        return
     
     # Spiele mit pygame ab
-    pygame.mixer.music.load(temp_file)
+    pygame.mixer.music.load(io.BytesIO(await synthesize(text)), "mp3")
     pygame.mixer.music.play()
     
-    # Warte bis Audio fertig ist
+    # Warte bis Audio fertig ist, ohne die Event-Loop zu blockieren
     while pygame.mixer.music.get_busy():
-        time.sleep(0.1)
+        await asyncio.sleep(0.02)
     
-    # WICHTIG: Entlade die Datei aus pygame
+    # Entlade den Puffer aus pygame
     pygame.mixer.music.unload()
-    
-    # Lösche temporäre Datei
-    try:
-        time.sleep(0.3)
-        os.remove(temp_file)
-    except Exception as e:
-        # Falls Löschen fehlschlägt, ignorieren
-        pass
 
 def speak(text):
     """Synchrone Wrapper-Funktion für speak_async."""
-    asyncio.run(speak_async(text))
+    asyncio.run_coroutine_threadsafe(speak_async(text), tts_loop).result()
+
+def load_prompt_mp3(text):
+    """Gibt die MP3-Daten einer festen Ansage aus dem Cache zurück, erzeugt sie bei Bedarf."""
+    # Die Stimme gehört zum Schlüssel, damit nach einem Stimmwechsel neu erzeugt wird
+    key = hashlib.sha1(f"{TTS_VOICE}|{text}".encode("utf-8")).hexdigest()
+    path = os.path.join(PROMPT_CACHE_DIR, f"{key}.mp3")
+    
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()
+    
+    mp3 = asyncio.run_coroutine_threadsafe(synthesize(text), tts_loop).result()
+    # Erst unter temporärem Namen schreiben, damit keine halben Dateien im Cache landen
+    with open(path + ".tmp", "wb") as f:
+        f.write(mp3)
+    os.replace(path + ".tmp", path)
+    return mp3
+
+def load_prompts():
+    """Lädt die festen Ansagen und dekodiert sie einmalig für pygame."""
+    os.makedirs(PROMPT_CACHE_DIR, exist_ok=True)
+    for text in STATIC_PROMPTS:
+        try:
+            prompt_sounds[text] = pygame.mixer.Sound(io.BytesIO(load_prompt_mp3(text)))
+        except Exception as e:
+            # Ohne Eintrag wird die Ansage später wie bisher live erzeugt
+            print(f"[SPEAK] Ansage '{text}' konnte nicht vorbereitet werden: {e}")
+
+# --- Befehle ---
+# Schlüsselwort -> Befehl
+COMMAND_KEYWORDS = {
+    "taschenrechner": "rechner",
+    "rechner": "rechner",
+    "editor": "notepad",
+    "notepad": "notepad",
+    "browser": "browser",
+    "internet": "browser",
+    "youtube": "youtube",
+    "explorer": "explorer",
+    "dateien": "explorer",
+    "uhrzeit": "uhrzeit",
+    "spät": "uhrzeit",
+    "datum": "datum",
+    "hallo": "hallo",
+    "guten morgen": "hallo",
+}
+find_command = compile_keywords(COMMAND_KEYWORDS)
 
 def execute_command(command_text):
     """Führt einen Befehl aus."""
     command_lower = command_text.lower()
+    command = find_command(command_lower)
     
     print(f"\n[ACTION] Verarbeite: '{command_text}'")
     
-    if "taschenrechner" in command_lower or "rechner" in command_lower:
+    if command == "rechner":
+        launch(["calc.exe"])
         speak("Öffne den Taschenrechner")
-        subprocess.Popen("calc.exe")
     
-    elif "editor" in command_lower or "notepad" in command_lower:
+    elif command == "notepad":
+        launch(["notepad.exe"])
         speak("Öffne Notepad")
-        subprocess.Popen("notepad.exe")
     
-    elif "browser" in command_lower or "internet" in command_lower:
+    elif command == "browser":
+        open_url("https://www.google.com")
         speak("Öffne den Browser")
-        webbrowser.open("https://www.google.com" )
     
-    elif "youtube" in command_lower:
+    elif command == "youtube":
+        open_url("https://www.youtube.com")
         speak("Öffne YouTube")
-        webbrowser.open("https://www.youtube.com" )
     
-    elif "explorer" in command_lower or "dateien" in command_lower:
+    elif command == "explorer":
+        launch(["explorer.exe"])
         speak("Öffne den Explorer")
-        subprocess.Popen("explorer.exe")
     
-    elif "uhrzeit" in command_lower or "spät" in command_lower or "datum" in command_lower:
-        from datetime import datetime
+    elif command == "uhrzeit":
+        now = datetime.now()
+        speak(f"Es ist {now.hour}:{now.minute:02d} Uhr")
+    
+    elif command == "datum":
         now = datetime.now()
-        time_str = now.strftime("%H:%M")
-        speak(f"Es ist {time_str} Uhr")
+        speak(f"Heute ist {WEEKDAYS_DE[now.weekday()]}, der {now.day}. {MONTHS_DE[now.month - 1]} {now.year}")
     
-    elif "hallo" in command_lower or "guten morgen" in command_lower:
+    elif command == "hallo":
         speak("Hallo! Wie kann ich helfen?")
     
     else:
         speak("Befehl nicht erkannt")
 
+# --- Audio ---
+# Ein einziger Eingabestream läuft die ganze Zeit. Der Callback reicht die
+# Frames nur weiter, solange zugehört wird, damit die eigenen Ansagen nicht
+# im Mikrofon landen.
+frame_queue = queue.Queue(maxsize=QUEUE_SIZE)
+listening = threading.Event()
+audio_callback = make_queue_callback(frame_queue, enabled=listening)
+
+def set_listening(active):
+    """Schaltet das Weiterreichen der Frames ein oder aus."""
+    if active:
+        # Veraltete Frames aus der Zeit davor verwerfen
+        while not frame_queue.empty():
+            frame_queue.get_nowait()
+        listening.set()
+    else:
+        listening.clear()
+
+def next_frame():
+    """Wartet auf den nächsten Frame (None nach 1 s, damit Strg+C unter Windows ankommt)."""
+    try:
+        return frame_queue.get(timeout=1)
+    except queue.Empty:
+        return None
+
 def listen_for_wake_word(oww_model):
     """Hört auf das Wake Word."""
     print(f"\n[LISTEN] Warte auf Wake Word '{WAKE_WORD}'...")
     
-    def callback(indata, frames, time, status):
-        audio_frame = np.frombuffer(indata, dtype=np.int16)
-        prediction = oww_model.predict(audio_frame)
-        if prediction["hey_jarvis"] > 0.95:
-            callback.detected = True
-            print(f"[DEBUG] Wake Word Score: {prediction['hey_jarvis']:.2f}")
-    
-    callback.detected = False
+    # Sammelpuffer, damit das Modell nur alle BATCH_FRAMES Frames aufgerufen wird
+    predict_batched = make_batcher(oww_model, CHUNK_SAMPLES, BATCH_FRAMES)
     
-    with sd.InputStream(samplerate=SAMPLE_RATE, channels=1, dtype='int16',
-                       blocksize=CHUNK_SAMPLES, callback=callback):
-        while not callback.detected:
-            time.sleep(0.1)
+    set_listening(True)
+    while True:
+        frame = next_frame()
+        if frame is None:
+            continue
+        
+        prediction = predict_batched(np.frombuffer(frame, dtype=np.int16))
+        if prediction is not None and prediction["hey_jarvis"] > 0.95:
+            print(f"[DEBUG] Wake Word Score: {prediction['hey_jarvis']:.2f}")
+            break
+    set_listening(False)
+    # Modellpuffer leeren, sonst löst dasselbe Wake Word erneut aus
+    oww_model.reset()
     
     time.sleep(0.5)
     return True
 
-def record_command_with_vad(vosk_model):
-    """Nimmt Audio auf bis Stille erkannt wird."""
+def record_command_with_vad(recognizer):
+    """Erkennt Sprache bis Stille erkannt wird und gibt den Text zurück."""
     print(f"[RECORD] Höre zu (spreche jetzt)...")
     
-    recognizer = KaldiRecognizer(vosk_model, SAMPLE_RATE)
-    recognizer.SetWords(True)
-    
-    audio_buffer = []
+    # Vosk erkennt schon während der Aufnahme, die fertigen Abschnitte
+    # werden hier gesammelt statt das Audio danach noch einmal zu dekodieren
+    segments = []
     last_speech_time = time.time()
     recording_started = False
-    start_time = time.time()
+    deadline = time.time() + MAX_RECORD_TIME
+    # Stille vor dem ersten lauten Frame wird Vosk gar nicht erst übergeben
+    sound_heard = False
+    previous_frame = None
     
-    def callback(indata, frames, time_info, status):
-        nonlocal last_speech_time, recording_started
+    set_listening(True)
+    while True:
+        current_time = time.time()
+        
+        if recording_started and (current_time - last_speech_time) > SILENCE_TIMEOUT:
+            print("\n[RECORD] Stille erkannt - Aufnahme beendet")
+            break
         
-        audio_frame = np.frombuffer(indata, dtype=np.int16)
-        audio_buffer.append(bytes(audio_frame))
+        if current_time > deadline:
+            print("\n[RECORD] Maximale Aufnahmezeit erreicht")
+            break
         
-        if recognizer.AcceptWaveform(bytes(audio_frame)):
-            result = json.loads(recognizer.Result())
-            if result.get("text", ""):
+        frame = next_frame()
+        if frame is None:
+            continue
+        
+        if not sound_heard:
+            if is_silent(np.frombuffer(frame, dtype=np.int16), SILENCE_THRESHOLD):
+                previous_frame = frame
+                continue
+            sound_heard = True
+            # Den letzten stillen Frame mitgeben, damit der Sprachanfang nicht fehlt
+            if previous_frame:
+                recognizer.AcceptWaveform(previous_frame)
+        
+        if recognizer.AcceptWaveform(frame):
+            text = json.loads(recognizer.Result()).get("text", "")
+            if text:
+                segments.append(text)
                 last_speech_time = time.time()
                 recording_started = True
                 print(".", end="", flush=True)
+    set_listening(False)
     
-    with sd.InputStream(samplerate=SAMPLE_RATE, channels=1, dtype='int16',
-                       blocksize=CHUNK_SAMPLES, callback=callback):
-        while True:
-            current_time = time.time()
-            
-            if recording_started and (current_time - last_speech_time) > SILENCE_TIMEOUT:
-                print("\n[RECORD] Stille erkannt - Aufnahme beendet")
-                break
-            
-            if (current_time - start_time) > MAX_RECORD_TIME:
-                print("\n[RECORD] Maximale Aufnahmezeit erreicht")
-                break
-            
-            time.sleep(0.1)
-    
-    return b''.join(audio_buffer)
+    # Rest nach dem letzten abgeschlossenen Abschnitt abholen
+    text = json.loads(recognizer.FinalResult()).get("text", "")
+    if text:
+        segments.append(text)
+    recognizer.Reset()
+    
+    return " ".join(segments)
 
 def main():
     """Hauptfunktion."""
     print("=== Voice Assistant mit VAD ===\n")
     
+    load_prompts()
     speak("Initialisiere System")
     
     print("Lade Wake-Word-Modell...")
-    oww_model = Model(wakeword_models=["hey_jarvis"])
+    oww_model = load_wakeword_model()
+    warm_up_wakeword_model(oww_model, CHUNK_SAMPLES * BATCH_FRAMES)
     
     print("Lade Speech-to-Text-Modell...")
     vosk_model = VoskModel(lang="de")
+    # Ein Erkenner für alle Befehle, wird nach jeder Aufnahme zurückgesetzt
+    recognizer = KaldiRecognizer(vosk_model, SAMPLE_RATE)
+    warm_up_recognizer(recognizer, SAMPLE_RATE)
     
     print("\n✓ System bereit!\n")
     speak("System bereit")
     
     try:
-        while True:
-            if listen_for_wake_word(oww_model):
-                print("[WAKE] Wake Word erkannt!")
-                
-                speak("Ja?")
-                
-                audio_data = record_command_with_vad(vosk_model)
-                
-                print("[STT] Verarbeite Sprache...")
-                recognizer = KaldiRecognizer(vosk_model, SAMPLE_RATE)
-                
-                if recognizer.AcceptWaveform(audio_data):
-                    result = json.loads(recognizer.Result())
-                else:
-                    result = json.loads(recognizer.FinalResult())
-                
-                command = result.get("text", "")
-                
-                if command:
-                    print(f"[STT] Erkannt: \"{command}\"")
-                    execute_command(command)
-                else:
-                    print("[STT] Nichts verstanden")
-                
-                print("\n✓ Cooldown...")
-                time.sleep(2.0)
-                print("✓ Bereit")
+        # Der Stream bleibt offen, statt ihn für Wake Word und Aufnahme
+        # jedes Mal neu zu öffnen
+        with sd.RawInputStream(samplerate=SAMPLE_RATE, channels=1, dtype='int16',
+                               blocksize=CHUNK_SAMPLES, latency='low', callback=audio_callback):
+            while True:
+                if listen_for_wake_word(oww_model):
+                    print("[WAKE] Wake Word erkannt!")
+                    
+                    speak("Ja?")
+                    
+                    command = record_command_with_vad(recognizer)
+                    
+                    if command:
+                        print(f"[STT] Erkannt: \"{command}\"")
+                        execute_command(command)
+                    else:
+                        print("[STT] Nichts verstanden")
+                    
+                    print("\n✓ Cooldown...")
+                    time.sleep(2.0)
+                    print("✓ Bereit")
     
     except KeyboardInterrupt:
         speak("Auf Wiedersehen")
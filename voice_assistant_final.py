@@ -1,18 +1,26 @@
 import time
 import json
-import subprocess
-import webbrowser
+import queue
+from datetime import datetime
 import sounddevice as sd
 import numpy as np
 import pyttsx3
-from openwakeword.model import Model
 from vosk import Model as VoskModel, KaldiRecognizer
+from launcher import launch, open_url
+from assistant_common import (load_wakeword_model, warm_up_wakeword_model,
+                              warm_up_recognizer, make_queue_callback, compile_keywords,
+                              make_batcher)
 
 # --- Konfiguration ---
 WAKE_WORD = "hey jarvis"
 SAMPLE_RATE = 16000
 CHUNK_SAMPLES = 1280
 RECORD_SECONDS = 5
+QUEUE_SIZE = 8  # Max. wartende Frames, bei Überlauf werden neue Frames verworfen
+BATCH_FRAMES = 3  # Frames pro Modellaufruf (3 x 80 ms = 240 ms)
+
+# Fester Puffer für die Befehlsaufnahme, wird für jede Aufnahme wiederverwendet
+record_buffer = bytearray(SAMPLE_RATE * 2 * RECORD_SECONDS)
 
 # --- Text-to-Speech ---
 tts_engine = pyttsx3.init()
@@ -25,39 +33,56 @@ def speak(text):
     tts_engine.say(text)
     tts_engine.runAndWait()
 
+# --- Befehle ---
+# Schlüsselwort -> Befehl
+COMMAND_KEYWORDS = {
+    "taschenrechner": "rechner",
+    "rechner": "rechner",
+    "editor": "notepad",
+    "notepad": "notepad",
+    "browser": "browser",
+    "internet": "browser",
+    "youtube": "youtube",
+    "explorer": "explorer",
+    "dateien": "explorer",
+    "uhrzeit": "uhrzeit",
+    "spät": "uhrzeit",
+    "hallo": "hallo",
+}
+find_command = compile_keywords(COMMAND_KEYWORDS)
+
 def execute_command(command_text):
     """Führt einen Befehl aus."""
     command_lower = command_text.lower()
+    command = find_command(command_lower)
     
     print(f"\n[ACTION] Verarbeite: '{command_text}'")
     
-    if "taschenrechner" in command_lower or "rechner" in command_lower:
+    if command == "rechner":
+        launch(["calc.exe"])
         speak("Öffne den Taschenrechner")
-        subprocess.Popen("calc.exe")
     
-    elif "editor" in command_lower or "notepad" in command_lower:
+    elif command == "notepad":
+        launch(["notepad.exe"])
         speak("Öffne Notepad")
-        subprocess.Popen("notepad.exe")
     
-    elif "browser" in command_lower or "internet" in command_lower:
+    elif command == "browser":
+        open_url("https://www.google.com")
         speak("Öffne den Browser")
-        webbrowser.open("https://www.google.com" )
     
-    elif "youtube" in command_lower:
+    elif command == "youtube":
+        open_url("https://www.youtube.com")
         speak("Öffne YouTube")
-        webbrowser.open("https://www.youtube.com" )
     
-    elif "explorer" in command_lower or "dateien" in command_lower:
+    elif command == "explorer":
+        launch(["explorer.exe"])
         speak("Öffne den Explorer")
-        subprocess.Popen("explorer.exe")
     
-    elif "uhrzeit" in command_lower or "spät" in command_lower:
-        from datetime import datetime
+    elif command == "uhrzeit":
         now = datetime.now()
-        time_str = now.strftime("%H:%M")
-        speak(f"Es ist {time_str} Uhr")
+        speak(f"Es ist {now.hour}:{now.minute:02d} Uhr")
     
-    elif "hallo" in command_lower:
+    elif command == "hallo":
         speak("Hallo! Wie kann ich helfen?")
     
     else:
@@ -67,35 +92,50 @@ def listen_for_wake_word(oww_model):
     """Hört auf das Wake Word und gibt True zurück wenn erkannt."""
     print(f"[LISTEN] Warte auf Wake Word...")
     
-    def callback(indata, frames, time, status):
-        audio_frame = np.frombuffer(indata, dtype=np.int16)
-        prediction = oww_model.predict(audio_frame)
-        if prediction["hey_jarvis"] > 0.5:
-            callback.detected = True
+    # Audio-Frames vom Callback an den Hauptthread, der das Modell auswertet
+    frame_queue = queue.Queue(maxsize=QUEUE_SIZE)
     
-    callback.detected = False
+    callback = make_queue_callback(frame_queue)
     
-    with sd.InputStream(samplerate=SAMPLE_RATE, channels=1, dtype='int16',
-                       blocksize=CHUNK_SAMPLES, callback=callback):
-        while not callback.detected:
-            time.sleep(0.1)
+    # Sammelpuffer, damit das Modell nur alle BATCH_FRAMES Frames aufgerufen wird
+    predict_batched = make_batcher(oww_model, CHUNK_SAMPLES, BATCH_FRAMES)
     
+    with sd.RawInputStream(samplerate=SAMPLE_RATE, channels=1, dtype='int16',
+                           blocksize=CHUNK_SAMPLES, latency='low', callback=callback):
+        while True:
+            try:
+                # Timeout, damit Strg+C auch unter Windows ankommt
+                frame = frame_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            
+            prediction = predict_batched(np.frombuffer(frame, dtype=np.int16))
+            if prediction is not None and prediction["hey_jarvis"] > 0.5:
+                break
+    
+    # Modellpuffer leeren, sonst löst dasselbe Wake Word erneut aus
+    oww_model.reset()
     return True
 
 def record_command():
     """Nimmt Audio für RECORD_SECONDS Sekunden auf."""
     print(f"[RECORD] Nehme {RECORD_SECONDS} Sekunden auf...")
-    audio_buffer = []
+    record_length = 0
     
     def callback(indata, frames, time, status):
-        audio_frame = np.frombuffer(indata, dtype=np.int16)
-        audio_buffer.append(bytes(audio_frame))
-    
-    with sd.InputStream(samplerate=SAMPLE_RATE, channels=1, dtype='int16',
-                       blocksize=CHUNK_SAMPLES, callback=callback):
+        nonlocal record_length
+        # In den festen Puffer kopieren; was nicht mehr hineinpasst, wird verworfen
+        end = record_length + frames * 2
+        if end <= len(record_buffer):
+            record_buffer[record_length:end] = indata
+            record_length = end
+    
+    with sd.RawInputStream(samplerate=SAMPLE_RATE, channels=1, dtype='int16',
+                           blocksize=CHUNK_SAMPLES, latency='low', callback=callback):
         time.sleep(RECORD_SECONDS)
     
-    return b''.join(audio_buffer)
+    # Vosk erwartet bytes, daher genau eine Kopie des belegten Teils
+    return bytes(memoryview(record_buffer)[:record_length])
 
 def main():
     """Hauptfunktion."""
@@ -104,10 +144,13 @@ def main():
     speak("Initialisiere System")
     
     print("Lade Wake-Word-Modell...")
-    oww_model = Model(wakeword_models=["hey_jarvis"])
+    oww_model = load_wakeword_model()
+    warm_up_wakeword_model(oww_model, CHUNK_SAMPLES * BATCH_FRAMES)
     
     print("Lade Speech-to-Text-Modell...")
     vosk_model = VoskModel(lang="de")
+    recognizer = KaldiRecognizer(vosk_model, SAMPLE_RATE)
+    warm_up_recognizer(recognizer, SAMPLE_RATE)
     
     print("\n✓ System bereit!\n")
     speak("System bereit")
@@ -126,7 +169,6 @@ def main():
                 
                 # 4. Stream wieder gestoppt - verarbeite Audio
                 print("[STT] Verarbeite...")
-                recognizer = KaldiRecognizer(vosk_model, SAMPLE_RATE)
                 
                 if recognizer.AcceptWaveform(audio_data):
                     result = json.loads(recognizer.Result())
@@ -143,6 +185,8 @@ def main():
                     print("[STT] Nichts verstanden")
                     speak("Ich habe nichts verstanden")
                 
+                # Erkenner zurücksetzen statt ihn für jeden Befehl neu anzulegen
+                recognizer.Reset()
                 print("\n✓ Bereit für nächsten Befehl\n")
     
     except KeyboardInterrupt:
@@ -1,22 +1,29 @@
 import time
 import json
-import subprocess
-import webbrowser
+import queue
+import threading
+from datetime import datetime
 import sounddevice as sd
 import numpy as np
 import pyttsx3
-from openwakeword.model import Model
 from vosk import Model as VoskModel, KaldiRecognizer
+from launcher import launch, open_url
+from assistant_common import (load_wakeword_model, warm_up_wakeword_model,
+                              warm_up_recognizer, make_queue_callback, compile_keywords)
 
 # --- Konfiguration ---
 WAKE_WORD = "hey jarvis"
 SAMPLE_RATE = 16000
 CHUNK_SAMPLES = 1280
 RECORD_SECONDS = 5
+QUEUE_SIZE = 8  # Max. wartende Frames, bei Überlauf werden neue Frames verworfen
 
 # --- Globale Zustandsvariablen ---
 wake_word_detected = False
-audio_buffer = []
+recording = False
+# Fester Puffer für die Befehlsaufnahme, wird für jeden Befehl wiederverwendet
+command_buffer = bytearray(SAMPLE_RATE * 2 * RECORD_SECONDS)
+command_length = 0
 
 # --- Text-to-Speech Engine initialisieren ---
 tts_engine = pyttsx3.init()
@@ -26,60 +33,74 @@ tts_engine.setProperty('volume', 0.9)  # Lautstärke
 def speak(text):
     """Spricht den gegebenen Text aus."""
     print(f"[SPEAK] {text}")
-    # Kurze Pause vor dem Sprechen
-    time.sleep(0.3)
     tts_engine.say(text)
     tts_engine.runAndWait()
-    # Kurze Pause nach dem Sprechen
-    time.sleep(0.3)
 
 
+# --- Befehle ---
+# Schlüsselwort -> Befehl
+COMMAND_KEYWORDS = {
+    "taschenrechner": "rechner",
+    "rechner": "rechner",
+    "editor": "notepad",
+    "notepad": "notepad",
+    "browser": "browser",
+    "internet": "browser",
+    "youtube": "youtube",
+    "explorer": "explorer",
+    "dateien": "explorer",
+    "uhrzeit": "uhrzeit",
+    "spät": "uhrzeit",
+    "hallo": "hallo",
+    "guten morgen": "hallo",
+}
+find_command = compile_keywords(COMMAND_KEYWORDS)
+
 def execute_command(command_text):
     """Führt einen Befehl basierend auf dem erkannten Text aus."""
     command_lower = command_text.lower()
+    command = find_command(command_lower)
     
     print(f"\n[ACTION] Verarbeite Befehl: '{command_text}'")
     
     # Taschenrechner öffnen
-    if "taschenrechner" in command_lower or "rechner" in command_lower:
+    if command == "rechner":
+        launch(["calc.exe"])
         speak("Öffne den Taschenrechner")
-        subprocess.Popen("calc.exe")
         return True
     
     # Notepad öffnen
-    elif "editor" in command_lower or "notepad" in command_lower:
+    elif command == "notepad":
+        launch(["notepad.exe"])
         speak("Öffne Notepad")
-        subprocess.Popen("notepad.exe")
         return True
     
     # Browser öffnen
-    elif "browser" in command_lower or "internet" in command_lower:
+    elif command == "browser":
+        open_url("https://www.google.com")
         speak("Öffne den Browser")
-        webbrowser.open("https://www.google.com" )
         return True
     
     # YouTube öffnen
-    elif "youtube" in command_lower:
+    elif command == "youtube":
+        open_url("https://www.youtube.com")
         speak("Öffne YouTube")
-        webbrowser.open("https://www.youtube.com" )
         return True
     
     # Datei-Explorer öffnen
-    elif "explorer" in command_lower or "dateien" in command_lower:
+    elif command == "explorer":
+        launch(["explorer.exe"])
         speak("Öffne den Datei Explorer")
-        subprocess.Popen("explorer.exe")
         return True
     
     # Uhrzeit sagen
-    elif "uhrzeit" in command_lower or "spät" in command_lower:
-        from datetime import datetime
+    elif command == "uhrzeit":
         now = datetime.now()
-        time_str = now.strftime("%H:%M")
-        speak(f"Es ist {time_str} Uhr")
+        speak(f"Es ist {now.hour}:{now.minute:02d} Uhr")
         return True
     
     # Begrüßung
-    elif "hallo" in command_lower or "guten morgen" in command_lower:
+    elif command == "hallo":
         speak("Hallo! Wie kann ich dir helfen?")
         return True
     
@@ -98,67 +119,93 @@ def execute_command(command_text):
 
 def main():
     """Hauptfunktion des Voice Assistants."""
-    global wake_word_detected, audio_buffer
+    global wake_word_detected, recording, command_length
 
     print("=== Voice Assistant mit Sprachausgabe gestartet ===")
     print("\nInitialisiere Wake-Word-Modell...")
-    oww_model = Model(wakeword_models=["hey_jarvis"])
+    oww_model = load_wakeword_model()
+    warm_up_wakeword_model(oww_model, CHUNK_SAMPLES)
 
     print("Initialisiere Speech-to-Text-Modell (Vosk)...")
     vosk_model = VoskModel(lang="de")
     recognizer = KaldiRecognizer(vosk_model, SAMPLE_RATE)
+    warm_up_recognizer(recognizer, SAMPLE_RATE)
 
     print(f"\n✓ Bereit! Höre auf das Wake Word: '{WAKE_WORD}'")
     print("✓ Drücke Strg+C zum Beenden.\n")
     
     speak("Voice Assistant bereit")
 
-    def callback(indata, frames, time, status):
-        global wake_word_detected, audio_buffer
-        if status:
-            print(status)
-        
-        audio_frame = np.frombuffer(indata, dtype=np.int16)
-
-        if wake_word_detected:
-            audio_buffer.append(bytes(audio_frame))
-        else:
-            prediction = oww_model.predict(audio_frame)
-            if prediction["hey_jarvis"] > 0.5:
-                print("\n[WAKE] Wake Word erkannt!")
-                speak("Ja?")
-                wake_word_detected = True
-                audio_buffer = []
-
-    with sd.InputStream(samplerate=SAMPLE_RATE, channels=1, dtype='int16', 
-                        blocksize=CHUNK_SAMPLES, callback=callback):
+    # Audio-Frames vom Callback an den Worker-Thread
+    frame_queue = queue.Queue(maxsize=QUEUE_SIZE)
+    # Signal vom Worker-Thread an den Hauptthread, sobald das Wake Word fällt
+    wake_event = threading.Event()
+
+    callback = make_queue_callback(frame_queue)
+
+    def audio_worker():
+        """Wertet die Audio-Frames außerhalb des PortAudio-Threads aus."""
+        global wake_word_detected, command_length
+        while True:
+            frame = frame_queue.get()
+
+            if recording:
+                # In den festen Puffer kopieren; was nicht mehr hineinpasst, wird verworfen
+                end = command_length + len(frame)
+                if end <= len(command_buffer):
+                    command_buffer[command_length:end] = frame
+                    command_length = end
+            elif not wake_word_detected:
+                prediction = oww_model.predict(np.frombuffer(frame, dtype=np.int16))
+                if prediction["hey_jarvis"] > 0.5:
+                    print("\n[WAKE] Wake Word erkannt!")
+                    # Modellpuffer leeren, sonst löst dasselbe Wake Word erneut aus
+                    oww_model.reset()
+                    wake_word_detected = True
+                    wake_event.set()
+            # Zwischen Wake Word und Aufnahme ("Ja?") werden die Frames verworfen
+
+    threading.Thread(target=audio_worker, daemon=True).start()
+
+    with sd.RawInputStream(samplerate=SAMPLE_RATE, channels=1, dtype='int16',
+                           blocksize=CHUNK_SAMPLES, latency='low', callback=callback):
         while True:
-            if wake_word_detected:
-                time.sleep(RECORD_SECONDS)
-
-                print("[STT] Verarbeite Sprache...")
-                full_audio = b''.join(audio_buffer)
-                
-                if recognizer.AcceptWaveform(full_audio):
-                    result = json.loads(recognizer.Result())
-                else:
-                    result = json.loads(recognizer.FinalResult())
-                
-                command = result.get("text", "")
-                
-                if command:
-                    print(f"[STT] Erkannt: \"{command}\"")
-                    execute_command(command)
-                else:
-                    print("[STT] Konnte nichts verstehen.")
-                    speak("Ich habe dich nicht verstanden")
-                
-                wake_word_detected = False
-                audio_buffer = []
-                recognizer = KaldiRecognizer(vosk_model, SAMPLE_RATE)
-                print(f"\n✓ Bereit für nächsten Befehl...\n")
+            # Auf das Wake Word warten. Der Timeout dient nur dazu, dass
+            # Strg+C auch unter Windows ankommt.
+            if not wake_event.wait(timeout=1):
+                continue
+            wake_event.clear()
+
+            # Die Antwort blockiert, daher im Hauptthread und erst danach aufnehmen
+            speak("Ja?")
+            command_length = 0
+            recording = True
+            time.sleep(RECORD_SECONDS)
+            recording = False
+
+            print("[STT] Verarbeite Sprache...")
+            # Vosk erwartet bytes, daher genau eine Kopie des belegten Teils
+            full_audio = bytes(memoryview(command_buffer)[:command_length])
+            
+            if recognizer.AcceptWaveform(full_audio):
+                result = json.loads(recognizer.Result())
+            else:
+                result = json.loads(recognizer.FinalResult())
+            
+            command = result.get("text", "")
+            
+            if command:
+                print(f"[STT] Erkannt: \"{command}\"")
+                execute_command(command)
+            else:
+                print("[STT] Konnte nichts verstehen.")
+                speak("Ich habe dich nicht verstanden")
             
-            time.sleep(0.1)
+            wake_word_detected = False
+            command_length = 0
+            # Erkenner zurücksetzen statt ihn für jeden Befehl neu anzulegen
+            recognizer.Reset()
+            print(f"\n✓ Bereit für nächsten Befehl...\n")
 
 if __name__ == "__main__":
     try: